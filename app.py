@@ -5,8 +5,16 @@ Hymn PDF Combiner - Complete application.
 import tkinter as tk
 from tkinter import messagebox
 from pathlib import Path
+from typing import Optional
 import threading
-import re
+import queue
+import io
+import os
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 
 
 class ModernStyle:
@@ -32,79 +40,224 @@ class ModernStyle:
     STATUS_FONT = ("Times New Roman", 9)
 
 
+# Shared widget options, built once and expanded at widget creation
+_ENTRY_KW = dict(font=ModernStyle.LABEL_FONT, relief="solid", bd=1, bg="white",
+                 highlightthickness=0,
+                 highlightbackground=ModernStyle.BORDER,
+                 highlightcolor=ModernStyle.PRIMARY)
+_HEADER_LABEL_KW = dict(font=ModernStyle.HEADER_FONT,
+                        bg=ModernStyle.BACKGROUND, fg=ModernStyle.TEXT)
+_BUTTON_KW = dict(font=ModernStyle.BUTTON_FONT, fg="white",
+                  relief="flat", bd=0, width=8, cursor="hand2")
+
+
+# Command that opens a folder in the platform's file manager
+_OPENER = {
+    "Windows": ["explorer"],
+    "Darwin": ["open"],  # macOS
+}.get(platform.system(), ["xdg-open"])  # Linux
+
+# Threads used to parse input PDFs ahead of the (single-threaded) writer
+_PARSE_WORKERS = 4
+
+# Minimum delay between progress redraws (~30 Hz)
+_PROGRESS_INTERVAL_MS = 33
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
 def parse_hymn_numbers(raw: str) -> list[int]:
     """Parse hymn numbers from user input."""
     raw = (raw or "").strip()
     if not raw:
         return []
 
-    tokens = re.split(r"[\s,;]+", raw)
+    tokens = raw.replace(",", " ").replace(";", " ").split()
     nums: list[int] = []
+    nums_append = nums.append
+    nums_extend = nums.extend
     for tok in tokens:
-        if not tok:
+        if tok.isdecimal():
+            if len(tok) <= 4:
+                nums_append(int(tok))
             continue
 
-        m = re.fullmatch(r"(\d{1,4})-(\d{1,4})", tok)
-        if m:
-            start = int(m.group(1))
-            end = int(m.group(2))
-            step = 1 if end >= start else -1
-            nums.extend(list(range(start, end + step, step)))
-            continue
-
-        if re.fullmatch(r"\d{1,4}", tok):
-            nums.append(int(tok))
+        if "-" in tok:
+            a, _, b = tok.partition("-")
+            if 0 < len(a) <= 4 and 0 < len(b) <= 4 and a.isdecimal() and b.isdecimal():
+                start = int(a)
+                end = int(b)
+                step = 1 if end >= start else -1
+                nums_extend(range(start, end + step, step))
 
     return nums
 
 
 def pdf_paths_for_hymn(pdf_dir: Path, hymn_number: int) -> list[Path]:
     """Find all PDF files for a given hymn number."""
-    if not pdf_dir.exists():
+    prefix_dot = f"{hymn_number}."
+    prefix_us = f"{hymn_number}_"
+
+    # scandir yields each entry once, so no dedup pass is needed
+    matches: list[tuple[tuple[int, str], str]] = []
+    try:
+        with os.scandir(pdf_dir) as it:
+            for entry in it:
+                name = entry.name
+                if (name.startswith((prefix_dot, prefix_us))
+                        and _hymn_file_number(name) == hymn_number):
+                    matches.append((_pdf_sort_key(name), entry.path))
+    except FileNotFoundError:
         return []
 
-    pattern = re.compile(rf"^{hymn_number}(?:\.|_).+\.pdf$", re.IGNORECASE)
-    exact = pdf_dir / f"{hymn_number}.pdf"
+    matches.sort()
+    return [Path(path) for _, path in matches]
 
-    matches: list[Path] = []
-    if exact.exists():
-        matches.append(exact)
 
-    for p in pdf_dir.glob(f"{hymn_number}_*.pdf"):
-        if pattern.match(p.name):
-            matches.append(p)
+def _hymn_file_number(name: str) -> Optional[int]:
+    """Return the hymn number of a "<n>.pdf" / "<n>[._]<rest>.pdf" name, else None."""
+    if name[-4:].lower() != ".pdf":
+        return None
 
-    def sort_key(p: Path):
-        m = re.search(r"_PAGE(\d+)", p.stem, flags=re.IGNORECASE)
-        page = int(m.group(1)) if m else 0
-        return (page, p.name.lower())
+    stem_end = len(name) - 4
+    i = 0
+    while i < stem_end and "0" <= name[i] <= "9":
+        i += 1
+    if i == 0:
+        return None
+    if i != stem_end and not (name[i] in "._" and i + 1 < stem_end):
+        return None
+    return int(name[:i])
 
-    return sorted(set(matches), key=sort_key)
 
+def _page_num(name: str) -> int:
+    """Return the number after the first "_PAGE<digits>" in name, else 0."""
+    upper = name.upper()
+    n = len(upper)
+    i = upper.find("_PAGE")
+    while i >= 0:
+        j = k = i + 5
+        while k < n and "0" <= upper[k] <= "9":
+            k += 1
+        if k > j:
+            return int(upper[j:k])
+        i = upper.find("_PAGE", i + 1)
+    return 0
 
-def merge_pdfs(input_paths: list[Path], output_path: Path) -> None:
-    """Merge multiple PDF files into one."""
+
+def _pdf_sort_key(name: str) -> tuple[int, str]:
+    """Order multi-page hymn files by their _PAGE number, then by name."""
+    return (_page_num(name), name.lower())
+
+
+def _build_pdf_index(pdf_dir: Path) -> dict[int, list[Path]]:
+    """Map hymn numbers to their PDF files with a single directory scan."""
+    buckets: dict[int, list[tuple[tuple[int, str], str]]] = {}
     try:
-        from pypdf import PdfMerger
-    except ImportError:
+        with os.scandir(pdf_dir) as it:
+            for entry in it:
+                name = entry.name
+                n = _hymn_file_number(name)
+                if n is None:
+                    continue
+                buckets.setdefault(n, []).append((_pdf_sort_key(name), entry.path))
+    except FileNotFoundError:
+        return {}
+
+    index: dict[int, list[Path]] = {}
+    for n, entries in buckets.items():
+        entries.sort()
+        index[n] = [Path(path) for _, path in entries]
+    return index
+
+
+_PDF_CLASSES = None
+
+
+def _get_pdf_classes():
+    """Resolve the PdfReader/PdfWriter classes once and cache them."""
+    global _PDF_CLASSES
+    if _PDF_CLASSES is None:
         try:
-            from PyPDF2 import PdfMerger
+            from pypdf import PdfReader, PdfWriter
         except ImportError:
-            raise ImportError("Install 'pypdf' (recommended) or 'PyPDF2' to merge PDFs")
+            try:
+                from PyPDF2 import PdfReader, PdfWriter
+            except ImportError:
+                raise ImportError("Install 'pypdf' (recommended) or 'PyPDF2' to merge PDFs")
+        _PDF_CLASSES = (PdfReader, PdfWriter)
+    return _PDF_CLASSES
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    merger = PdfMerger()
-    try:
+_PIKEPDF = None
+
+
+def _get_pikepdf():
+    """Return the pikepdf module if it is installed, else None (cached)."""
+    global _PIKEPDF
+    if _PIKEPDF is None:
+        try:
+            import pikepdf
+        except ImportError:
+            pikepdf = False
+        _PIKEPDF = pikepdf
+    return _PIKEPDF or None
+
+
+def _merge_with_pikepdf(pikepdf, input_paths: list[Path], output_path: Path) -> None:
+    """Merge PDFs with pikepdf (QPDF), sharing resources of repeated inputs."""
+    with ExitStack() as stack:
+        pdf = stack.enter_context(pikepdf.Pdf.new())
+        # Sources must stay open until the merged file is saved; opening them
+        # from memory means they hold no OS file handles meanwhile
+        sources = {}
         for p in input_paths:
-            merger.append(str(p))
-        with output_path.open("wb") as f:
-            merger.write(f)
-    finally:
+            key = str(p)
+            src = sources.get(key)
+            if src is None:
+                data = io.BytesIO(Path(key).read_bytes())
+                src = sources[key] = stack.enter_context(pikepdf.open(data))
+            pdf.pages.extend(src.pages)
+        pdf.save(output_path)
+
+
+def _preload_pdf_backend() -> None:
+    """Import the PDF library ahead of the first merge."""
+    if _get_pikepdf() is None:
         try:
-            merger.close()
-        except Exception:
-            pass
+            _get_pdf_classes()
+        except ImportError:
+            pass  # Reported to the user when a merge is attempted
+
+
+def _read_pdf(path: str):
+    """Parse a PDF from an in-memory copy, so no file handle outlives the call."""
+    PdfReader, _ = _get_pdf_classes()
+    return PdfReader(io.BytesIO(Path(path).read_bytes()), strict=False)
+
+
+def merge_pdfs(input_paths: list[Path], output_path: Path) -> None:
+    """Merge multiple PDF files into one."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    pikepdf = _get_pikepdf()
+    if pikepdf is not None:
+        _merge_with_pikepdf(pikepdf, input_paths, output_path)
+        return
+
+    _, PdfWriter = _get_pdf_classes()
+
+    writer = PdfWriter()
+    # Parse each distinct file once so repeated hymns share their objects;
+    # parsing overlaps in a thread pool, appending stays on this thread
+    unique = list(dict.fromkeys(str(p) for p in input_paths))
+    with ThreadPoolExecutor(max_workers=_PARSE_WORKERS) as pool:
+        parsed = pool.map(_read_pdf, unique)
+        readers = dict(zip(unique, parsed))
+    for p in input_paths:
+        writer.append(readers[str(p)], import_outline=False)
+    with output_path.open("wb") as f:
+        writer.write(f)
 
 
 class HymnCombinerApp:
@@ -115,6 +268,7 @@ class HymnCombinerApp:
         self.setup_window()
         self.setup_paths()
         self.setup_ui()
+        self.setup_worker()
         
     def setup_window(self):
         """Setup main window properties."""
@@ -128,9 +282,34 @@ class HymnCombinerApp:
         
     def setup_paths(self):
         """Setup application paths."""
-        self.base_dir = Path(__file__).resolve().parent
+        self.base_dir = BASE_DIR
         self.pdf_dir = self.base_dir / "pdf"
         self.output_dir = self.base_dir / "output"
+        # Hymn index reused across merges while the pdf folder's mtime is unchanged
+        self._index = None
+        self._index_mtime = None
+        
+    def setup_worker(self):
+        """Start the background thread that runs queued merge jobs."""
+        # Latest progress not yet drawn; updates are coalesced to one redraw per interval
+        self._progress_lock = threading.Lock()
+        self._pending_progress = None
+        self._progress_scheduled = False
+        
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker.start()
+        
+    def _worker_loop(self):
+        """Run merge jobs one at a time as they are queued."""
+        # Pay the PDF library import cost while the user is still typing
+        _preload_pdf_backend()
+        while True:
+            job = self._jobs.get()
+            try:
+                self.merge_pdfs(*job)
+            finally:
+                self._jobs.task_done()
         
     def setup_ui(self):
         """Setup user interface."""
@@ -177,28 +356,17 @@ class HymnCombinerApp:
         container.pack(fill=tk.BOTH, expand=True, padx=30, pady=10)
         
         # Hymn numbers input with better alignment
-        hymn_label = tk.Label(container, text="Hymn Numbers",
-                            font=ModernStyle.HEADER_FONT,
-                            bg=ModernStyle.BACKGROUND, fg=ModernStyle.TEXT)
+        hymn_label = tk.Label(container, text="Hymn Numbers", **_HEADER_LABEL_KW)
         hymn_label.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
         
         # Hymn input and clear button
-        self.hymn_entry = tk.Entry(container, 
-                                  font=ModernStyle.LABEL_FONT,
-                                  relief="solid", bd=1,
-                                  bg="white",
-                                  highlightthickness=0,
-                                  highlightbackground=ModernStyle.BORDER,
-                                  highlightcolor=ModernStyle.PRIMARY)
+        self.hymn_entry = tk.Entry(container, **_ENTRY_KW)
         self.hymn_entry.grid(row=1, column=0, sticky=tk.EW, padx=(0, 5), pady=(0, 5))
         
         clear_btn = tk.Button(container, text="Clear",
-                            font=ModernStyle.BUTTON_FONT,
-                            bg=ModernStyle.ERROR, fg="white",
-                            relief="flat", bd=0,
-                            width=8,
+                            bg=ModernStyle.ERROR,
                             command=self.clear_hymn_input,
-                            cursor="hand2")
+                            **_BUTTON_KW)
         clear_btn.grid(row=1, column=1, sticky=tk.W, padx=(0, 0), pady=(0, 5))
         
         # Examples label below input
@@ -209,18 +377,10 @@ class HymnCombinerApp:
         examples_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 15))
         
         # Output filename and merge button
-        filename_label = tk.Label(container, text="Output Filename",
-                                font=ModernStyle.HEADER_FONT,
-                                bg=ModernStyle.BACKGROUND, fg=ModernStyle.TEXT)
+        filename_label = tk.Label(container, text="Output Filename", **_HEADER_LABEL_KW)
         filename_label.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
         
-        self.filename_entry = tk.Entry(container,
-                                      font=ModernStyle.LABEL_FONT,
-                                      relief="solid", bd=1,
-                                      bg="white",
-                                      highlightthickness=0,
-                                      highlightbackground=ModernStyle.BORDER,
-                                      highlightcolor=ModernStyle.PRIMARY)
+        self.filename_entry = tk.Entry(container, **_ENTRY_KW)
         self.filename_entry.grid(row=4, column=0, sticky=tk.EW, padx=(0, 5), pady=(0, 15))
         self.filename_entry.insert(0, "combined.pdf")
         
@@ -228,14 +388,9 @@ class HymnCombinerApp:
         self.merge_button = tk.Button(
             container,
             text="🚀 Merge",
-            font=ModernStyle.BUTTON_FONT,
             bg=ModernStyle.PRIMARY,
-            fg="white",
-            relief="flat",
-            bd=0,
-            width=8,
             command=self.start_merge,
-            cursor="hand2",
+            **_BUTTON_KW,
         )
         self.merge_button.grid(row=4, column=1, sticky=tk.W, padx=(0, 0), pady=(0, 15))
         
@@ -323,14 +478,34 @@ class HymnCombinerApp:
         # Clear hymn input for new task
         self.hymn_entry.delete(0, tk.END)
         
-        # Run merge in separate thread
-        thread = threading.Thread(target=self.merge_pdfs, args=(hymn_input, output_filename))
-        thread.daemon = True
-        thread.start()
+        # Hand the merge to the background worker
+        self._jobs.put((hymn_input, output_filename))
         
     def update_progress(self, percentage, status_text):
         """Update progress bar and status text."""
-        self.root.after(0, self._update_progress_ui, percentage, status_text)
+        if percentage in (0, 100):
+            # Start/reset and final states are drawn at once; anything still
+            # pending is older, so drop it rather than let it overwrite them
+            with self._progress_lock:
+                self._pending_progress = None
+            self.root.after(0, self._update_progress_ui, percentage, status_text)
+            return
+            
+        with self._progress_lock:
+            self._pending_progress = (percentage, status_text)
+            if self._progress_scheduled:
+                return
+            self._progress_scheduled = True
+        self.root.after(_PROGRESS_INTERVAL_MS, self._flush_progress)
+        
+    def _flush_progress(self):
+        """Draw the most recent pending progress update (called from main thread)."""
+        with self._progress_lock:
+            pending = self._pending_progress
+            self._pending_progress = None
+            self._progress_scheduled = False
+        if pending is not None:
+            self._update_progress_ui(*pending)
         
     def _update_progress_ui(self, percentage, status_text):
         """Update progress UI elements (called from main thread)."""
@@ -338,7 +513,6 @@ class HymnCombinerApp:
         self.progress_label.config(text=f"Status: {status_text}")
         
         # Update progress bar
-        self.root.update_idletasks()
         progress_frame_width = self.progress_bar.master.winfo_width()
         if progress_frame_width > 1:
             bar_width = int((percentage / 100) * (progress_frame_width - 2))
@@ -350,6 +524,19 @@ class HymnCombinerApp:
         else:
             self.progress_percent.config(text=f"{percentage}%")
             
+    def get_pdf_index(self):
+        """Return the hymn index, rescanning only if the pdf folder changed."""
+        try:
+            mtime = os.stat(self.pdf_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._index = self._index_mtime = None
+            return {}
+            
+        if self._index is None or mtime != self._index_mtime:
+            self._index = _build_pdf_index(self.pdf_dir)
+            self._index_mtime = mtime
+        return self._index
+        
     def merge_pdfs(self, hymn_input, output_filename):
         """Perform actual PDF merging with progress tracking."""
         try:
@@ -358,11 +545,10 @@ class HymnCombinerApp:
             hymn_numbers = parse_hymn_numbers(hymn_input)
             if not hymn_numbers:
                 self.update_progress(100, "Error - No valid hymn numbers")
-                self.root.after(0, lambda: messagebox.showerror("Error", "No valid hymn numbers found."))
+                self.root.after(0, partial(self.show_error, "Error", "No valid hymn numbers found."))
                 return
                 
             # Setup output path
-            self.update_progress(20, "Setting up output path...")
             output_path = Path(output_filename)
             if not output_path.is_absolute():
                 output_path = self.output_dir / output_path.name
@@ -371,9 +557,10 @@ class HymnCombinerApp:
             self.update_progress(30, "Finding PDF files...")
             missing = []
             to_merge = []
+            index = self.get_pdf_index()
             
             for i, n in enumerate(hymn_numbers):
-                paths = pdf_paths_for_hymn(self.pdf_dir, n)
+                paths = index.get(n, [])
                 if not paths:
                     missing.append(n)
                     continue
@@ -387,20 +574,21 @@ class HymnCombinerApp:
                 error_msg = "No PDF files found for the provided hymn numbers."
                 if missing:
                     error_msg += f"\nMissing: {', '.join(map(str, missing))}"
-                self.root.after(0, lambda: messagebox.showerror("Error", error_msg))
+                self.root.after(0, partial(self.show_error, "Error", error_msg))
                 return
             
             # Merge PDFs
             self.update_progress(60, "Merging PDF files...")
             merge_pdfs(to_merge, output_path)
-            self.update_progress(90, "Finalizing merge...")
             
-            # Prepare success message
+            # Prepare success message (file details gathered here, off the Tk thread)
+            saved_to = output_path if output_path.is_absolute() else output_path.resolve()
+            file_size = output_path.stat().st_size
             success_msg = f"PDF merged successfully!\n\n"
             success_msg += f"Total hymns processed: {len(hymn_numbers)}\n"
             success_msg += f"Total PDF files merged: {len(to_merge)}\n\n"
-            success_msg += f"Saved to: {output_path.absolute()}\n"
-            success_msg += f"File size: {output_path.stat().st_size:,} bytes\n\n"
+            success_msg += f"Saved to: {saved_to}\n"
+            success_msg += f"File size: {file_size:,} bytes\n\n"
             success_msg += f"Would you like to open the output folder to see your merged PDF?"
             
             if missing:
@@ -409,32 +597,32 @@ class HymnCombinerApp:
             # Mark as Done before showing message box
             self.update_progress(100, "Done")
                 
-            # Show success message with option to open folder
-            result = messagebox.askyesno("Success!", success_msg)
-            if result:
-                import subprocess
-                import platform
-                
-                try:
-                    if platform.system() == "Windows":
-                        subprocess.run(["explorer", str(output_path.parent)], check=False)
-                    elif platform.system() == "Darwin":  # macOS
-                        subprocess.run(["open", str(output_path.parent)], check=False)
-                    else:  # Linux
-                        subprocess.run(["xdg-open", str(output_path.parent)], check=False)
-                except Exception as e:
-                    messagebox.showinfo("Info", f"Could not open folder automatically. Please check:\n{output_path.parent}")
+            # Show success message with option to open folder (on the Tk thread)
+            self.root.after(0, partial(self.show_success, success_msg, output_path.parent))
             
         except ImportError as e:
             self.update_progress(100, "Error - Missing dependency")
             error_msg = f"Missing dependency: {e}\n\nInstall with: pip install pypdf"
-            self.root.after(0, lambda: messagebox.showerror("Dependency Error", error_msg))
+            self.root.after(0, partial(self.show_error, "Dependency Error", error_msg))
         except Exception as e:
             self.update_progress(100, "Error - Merge failed")
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to merge PDFs: {e}"))
-        finally:
-            # Restore UI state
-            self.root.after(0, self.restore_ui_state)
+            self.root.after(0, partial(self.show_error, "Error", f"Failed to merge PDFs: {e}"))
+            
+    def show_error(self, title, message):
+        """Show an error dialog, then restore the UI once it is closed."""
+        messagebox.showerror(title, message)
+        self.restore_ui_state()
+        
+    def show_success(self, success_msg, output_folder):
+        """Show the success dialog and optionally open the output folder."""
+        result = messagebox.askyesno("Success!", success_msg)
+        if result:
+            try:
+                # Popen so the Tk thread never waits on the file manager
+                subprocess.Popen(_OPENER + [str(output_folder)])
+            except Exception as e:
+                messagebox.showinfo("Info", f"Could not open folder automatically. Please check:\n{output_folder}")
+        self.restore_ui_state()
             
     def restore_ui_state(self):
         """Restore UI state after merge completion."""